@@ -73,7 +73,7 @@ AccelStepper stepper_az = AccelStepper(stepper_az.DRIVER, STEP_AZ, DIR_AZ);
 
 void read_serial_velocity() {
   /* flush serial buffer without blocking and store promted relative velocities */
-  char rcv;
+  int rcv;  // char is signed on AVR, bytes above 127 would be read as negative
   int i=0;
   while (Serial.available()) {
     rcv = Serial.read();
@@ -0,0 +1,123 @@
+"""
+startup benchmark of the solver entry point
+
+Measures the import time of `src.solver` and the latency until the first frame
+is solved (warmup + solve), each in a fresh interpreter. The script exits with
+status 1 if one of the budgets is exceeded, so it can be used as a check.
+
+usage: python scripts/benchmark_startup.py [--import-budget 0.5] [--frame-budget 2.0]
+"""
+
+import argparse
+import json
+import subprocess
+import time
+import numpy as np
+
+# allow imports from parent folder
+import sys, os
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(1, ROOT)
+
+IMPORT_CODE = """
+import time
+t = time.perf_counter()
+import src.solver
+print(time.perf_counter() - t)
+"""
+
+
+def synthetic_frame(shape=(600, 800), n_stars=40, seed=0):
+    """gray uint8 frame with gaussian stars on a noisy background"""
+    rng = np.random.default_rng(seed)
+    img = rng.normal(20, 4, shape)
+    yy, xx = np.mgrid[: shape[0], : shape[1]]
+    for y, x, peak in zip(
+        rng.uniform(40, shape[0] - 40, n_stars),
+        rng.uniform(40, shape[1] - 40, n_stars),
+        rng.uniform(120, 230, n_stars),
+    ):
+        img += peak * np.exp(-((yy - y) ** 2 + (xx - x) ** 2) / (2 * 2.0**2))
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def synthetic_hashtable(n_rows=100000, seed=0):
+    from src.HashTable import HashTable
+
+    rng = np.random.default_rng(seed)
+    htable = HashTable(n_rows)
+    htable.codes[:] = rng.uniform(0, 1, htable.codes.shape)
+    htable.origin[:] = rng.uniform(0, 1, htable.origin.shape)
+    htable.ptr = n_rows
+    return htable
+
+
+def measure_first_frame(table):
+    """time from importing the solver until the first frame is solved"""
+    t_start = time.perf_counter()
+    from src import solver
+    from src.HashTable import HashTable
+
+    t_import = time.perf_counter()
+    hashtable = synthetic_hashtable() if table is None else HashTable().load(table)
+    img = synthetic_frame()
+    t_setup = time.perf_counter()
+    solver.warmup()
+    t_warmup = time.perf_counter()
+    solver.solve(img, hashtable)
+    t_solve = time.perf_counter()
+    return {
+        "import": t_import - t_start,
+        "warmup": t_warmup - t_setup,
+        "solve": t_solve - t_warmup,
+        "first_frame": (t_import - t_start) + (t_solve - t_setup),
+    }
+
+
+def run(code_args, repeat):
+    """run python in fresh interpreters and return last printed line of each run"""
+    outputs = []
+    for _ in range(repeat):
+        out = subprocess.run(
+            [sys.executable] + code_args,
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        outputs.append(out.strip().splitlines()[-1])
+    return outputs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="solver startup benchmark")
+    parser.add_argument("--import-budget", type=float, default=0.5, help="s")
+    parser.add_argument("--frame-budget", type=float, default=2.0, help="s")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--table", default=None, help="pickled HashTable")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure_first_frame(args.table)))
+        sys.exit(0)
+
+    t_import = np.median([float(o) for o in run(["-c", IMPORT_CODE], args.repeat)])
+
+    child_args = [os.path.abspath(__file__), "--child"]
+    if args.table is not None:
+        child_args += ["--table", os.path.abspath(args.table)]
+    # first run populates numba's on-disk cache, it is reported but not budgeted
+    cold, *warm = [json.loads(o) for o in run(child_args, args.repeat + 1)]
+    t_frame = np.median([w["first_frame"] for w in warm])
+
+    print(f"import src.solver:  {t_import:.3f}s (budget {args.import_budget:.3f}s)")
+    print(f"first frame (cold): {cold['first_frame']:.3f}s")
+    print(f"first frame:        {t_frame:.3f}s (budget {args.frame_budget:.3f}s)")
+    for key in ["import", "warmup", "solve"]:
+        print(f"  {key:8s} {np.median([w[key] for w in warm]):.3f}s")
+
+    if t_import > args.import_budget or t_frame > args.frame_budget:
+        print("startup budget exceeded")
+        sys.exit(1)
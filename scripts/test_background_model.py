@@ -0,0 +1,90 @@
+"""
+compare BackgroundModel with gaussian_window_filter on synthetic frame streams
+
+1. tracked field: well-focused (undersampled) stars stay on the same pixels,
+   the model must keep all detections of the window filter
+2. moving field with a hot pixel: the hot pixel stays on the sensor while the
+   stars move with the pointing, only the hot pixel may be masked
+
+Exits non-zero on failure.
+"""
+
+import os
+import sys
+
+import numpy as np
+
+# allow imports from parent folder
+sys.path.insert(1, os.path.join(sys.path[0], ".."))
+
+from src import star_detection as sd
+from src.BackgroundModel import BackgroundModel
+
+W = 25
+SHAPE = (400, 600)
+N_STARS = 10
+N_FRAMES = 60
+PSF_SIGMA = 0.5  # pixels, undersampled like a well-focused star
+PIXEL_SCALE = 3e-4  # RAD per pixel, min_shift of BackgroundModel is 3.3 pixels
+HOT_PIXEL = (200, 300)
+
+rng = np.random.default_rng(0)
+stars = np.column_stack(
+    (
+        rng.uniform(60, SHAPE[0] - 60, N_STARS),
+        rng.uniform(60, SHAPE[1] - 60, N_STARS),
+        rng.uniform(150, 230, N_STARS),
+    )
+)
+yy, xx = np.mgrid[: SHAPE[0], : SHAPE[1]]
+
+
+def frame(offset=(0, 0), hot_pixel=False):
+    """noisy frame with stars shifted by offset (pixels)"""
+    img = rng.normal(30, 3, SHAPE)
+    for y, x, peak in stars:
+        y, x = y + offset[0], x + offset[1]
+        img += peak * np.exp(-((yy - y) ** 2 + (xx - x) ** 2) / (2 * PSF_SIGMA**2))
+    if hot_pixel:
+        img[HOT_PIXEL] = 230
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def detections(img_filtered):
+    return {tuple(p) for p in sd.detect_stars(img_filtered)[0]}
+
+
+errors = []
+
+# tracked field, pointing is constant
+model = BackgroundModel(W)
+for _ in range(N_FRAMES):
+    img = frame()
+    filtered = model.normalize(img, pointing=(1.0, 0.5))
+reference = detections(sd.gaussian_window_filter(img, W))
+detected = detections(filtered)
+print(f"tracked: {len(reference)} reference, {len(detected)} detected, {model}")
+if len(reference) != N_STARS or detected != reference:
+    errors.append(f"tracked field lost detections: {reference - detected}")
+if model.hot_pixels.sum() != 0:
+    errors.append(f"tracked field masked {model.hot_pixels.sum()} pixels")
+
+# moving field with hot pixel, stars drift by 5 pixels per frame
+model = BackgroundModel(W)
+for i_frame in range(N_FRAMES):
+    offset = (0, 5 * (i_frame % 9) - 20)
+    pointing = (1.0 + offset[1] * PIXEL_SCALE, 0.5)
+    img = frame(offset, hot_pixel=True)
+    filtered = model.normalize(img, pointing=pointing)
+hot = np.argwhere(model.hot_pixels) + W // 2
+print(f"moving: hot pixels {hot.tolist()}, {model}")
+if hot.tolist() != [list(HOT_PIXEL)]:
+    errors.append(f"hot pixel {HOT_PIXEL} not masked alone, got {hot.tolist()}")
+reference = detections(sd.gaussian_window_filter(img, W))
+hot_filtered = (HOT_PIXEL[0] - W // 2, HOT_PIXEL[1] - W // 2)
+if detections(filtered) != reference - {hot_filtered}:
+    errors.append("moving field detections differ besides the hot pixel")
+
+for error in errors:
+    print("FAILED:", error)
+sys.exit(1 if errors else 0)
@@ -0,0 +1,88 @@
+"""
+run MotionController against a pseudo-terminal standing in for the Arduino
+
+The reading end decodes commands like read_serial_velocity() in
+hardware/motion_control/motion_control.ino. Setpoints are produced faster than
+the firmware loop to show command coalescing and rate limiting. Exits non-zero
+if the commands are malformed, violate the rate limit or do not end with the
+stop command.
+"""
+
+import os
+import pty
+import threading
+import time
+import tty
+import numpy as np
+
+# allow imports from parent folder
+import sys
+
+sys.path.insert(1, os.path.join(sys.path[0], ".."))
+
+from src.MotionController import MotionController, N_STOP, PROMT_UPDATE_TIME
+
+SOLVE_RATE = 50  # Hz, rate of simulated solve results
+DURATION = 3  # s
+
+master, slave = pty.openpty()
+tty.setraw(master)
+tty.setraw(slave)
+
+received = []  # (receive time, vel_al, vel_az)
+malformed = []  # commands without line break
+
+
+def arduino():
+    """decode 3-byte velocity commands from the master side of the pty"""
+    buffer = b""
+    while True:
+        try:
+            buffer += os.read(master, 64)
+        except OSError:
+            return  # slave side closed
+        while len(buffer) >= 3:
+            command, buffer = buffer[:3], buffer[3:]
+            if command[2] != ord("\n"):
+                malformed.append(command)
+            vel = (np.array(list(command[:2]), dtype=float) - 128) / 128
+            received.append((time.perf_counter(), float(vel[0]), float(vel[1])))
+
+
+reader = threading.Thread(target=arduino, daemon=True)
+reader.start()
+
+controller = MotionController(os.fdopen(slave, "wb", buffering=0))
+with controller:
+    t_start = time.perf_counter()
+    while time.perf_counter() - t_start < DURATION:
+        t_result = time.perf_counter()
+        vel = np.sin(t_result - t_start)
+        controller.set_velocity(vel, -vel, t_result)
+        time.sleep(1 / SOLVE_RATE)
+time.sleep(0.1)
+os.close(master)
+
+n_setpoints = controller.n_sent + controller.n_coalesced
+intervals = np.diff([r[0] for r in received])
+print(f"setpoints: {n_setpoints}, sent: {controller.n_sent}")
+print(f"coalesced: {controller.n_coalesced}, received commands: {len(received)}")
+print(
+    f"min command interval: {np.min(intervals):.3f}s (limit {controller.update_time}s,"
+    f" firmware {PROMT_UPDATE_TIME}s)"
+)
+print(f"last commands: {[r[1:] for r in received[-N_STOP:]]} (stop)")
+print("latency solve result -> bytes on wire:", controller.latency_stats())
+
+errors = []
+if malformed:
+    errors.append(f"{len(malformed)} malformed commands, e.g. {malformed[0]}")
+if np.min(intervals) < controller.update_time - 1e-3:
+    errors.append(f"rate limit violated, interval {np.min(intervals):.3f}s")
+if controller.update_time <= PROMT_UPDATE_TIME:
+    errors.append("update time does not exceed firmware loop")
+if len(received) < N_STOP or any(r[1:] != (0.0, 0.0) for r in received[-N_STOP:]):
+    errors.append(f"last {N_STOP} commands are not the stop command")
+for error in errors:
+    print("FAILED:", error)
+sys.exit(1 if errors else 0)
@@ -0,0 +1,182 @@
+"""running background, noise and hot-pixel model for continuous frame streams"""
+
+import copy
+import threading
+
+import numpy as np
+
+
+class BackgroundModel:
+    """
+    Stateful replacement of `gaussian_window_filter(img, w)` for video-rate capture.
+
+    The local mean and standard deviation of every (w x w) window change only
+    slowly between frames, so they are refreshed every `update_every` frames
+    with box filters and blended into the running estimate:
+
+        mean <- (1 - rate) * mean + rate * local_mean(frame)
+
+    Hot pixels are single pixels much brighter than all their neighbours. A
+    well-focused star looks the same, but it moves over the sensor with the
+    pointing while a hot pixel stays. The hot-pixel score is therefore only
+    updated at refreshes where the `pointing` passed to normalize() has moved
+    by more than `min_shift` since the last score update. It decays with
+    `hot_rate` and pixels are masked once it exceeds 0.5, i.e. after spiking
+    at several different pointings. Without pointing, no pixel is masked.
+
+    Per frame, only the precomputed threshold map `mean + n_sigma * std` is
+    compared with the frame, which is orders of magnitude cheaper than the
+    window filter. Like gaussian_window_filter(), normalize() returns the
+    (H-w, W-w) frame, so star coordinates are unchanged for detect_stars().
+
+    The model can be shared by threads, or copied (and pickled) for worker
+    processes, reset() starts over e.g. with another camera.
+
+    Attributes:
+    ----------
+        w:            int, odd width of local window in pixels
+        n_sigma:      float, threshold above background in standard deviations
+        rate:         float, blending rate of background refreshes
+        update_every: int, number of frames between refreshes
+        hot_ratio:    float, hot pixel exceeds hot_ratio * brightest neighbour
+        hot_offset:   float, ... plus hot_offset
+        hot_rate:     float, blending rate of hot-pixel scores
+        min_shift:    float, change of pointing between hot-pixel updates in
+                      RAD, must move stars by several pixels
+    """
+
+    def __init__(
+        self,
+        w=25,
+        n_sigma=2.0,
+        rate=0.2,
+        update_every=8,
+        hot_ratio=2.0,
+        hot_offset=20.0,
+        hot_rate=0.2,
+        min_shift=1e-3,
+    ):
+        assert w % 2 == 1
+        self.w = w
+        self.n_sigma = n_sigma
+        self.rate = rate
+        self.update_every = update_every
+        self.hot_ratio = hot_ratio
+        self.hot_offset = hot_offset
+        self.hot_rate = hot_rate
+        self.min_shift = min_shift
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """forget background, noise and hot pixels"""
+        self.mean = None  # (H-w, W-w) float32 background
+        self.var = None  # (H-w, W-w) float32 noise variance
+        self.hot_score = None  # (H-w, W-w) float32 in [0, 1]
+        self.n_frames = 0
+        self._hot_pointing = None  # pointing at last hot-pixel update
+        self._threshold = None  # (H-w, W-w) uint16, 256 for masked pixels
+
+    @property
+    def hot_pixels(self):
+        """(H-w, W-w) bool mask of hot pixels, empty before the first frame"""
+        if self.hot_score is None:
+            return np.zeros((0, 0), dtype=bool)
+        return self.hot_score > 0.5
+
+    def _crop(self, img):
+        hw = self.w // 2
+        return img[hw : hw + img.shape[0] - self.w, hw : hw + img.shape[1] - self.w]
+
+    def _moved(self, pointing):
+        """whether pointing changed since the last hot-pixel update"""
+        if pointing is None:
+            return False
+        if self._hot_pointing is None:
+            self._hot_pointing = pointing  # reference for the next refresh
+            return False
+        shift = np.max(np.abs(np.subtract(pointing, self._hot_pointing)))
+        if shift <= self.min_shift:
+            return False
+        self._hot_pointing = pointing
+        return True
+
+    def update(self, frame, pointing=None):
+        """
+        refresh background, noise and hot-pixel estimates with a frame
+
+        pointing : (optional) tuple of pointing coordinates in RAD, e.g. (ra,
+                   dec) of the last solve, required for hot-pixel detection
+        """
+        import cv2  # imported lazily, OpenCV dominates the import time
+
+        img = frame.astype(np.float32)
+        mean = self._crop(cv2.blur(img, (self.w, self.w)))
+        var = np.maximum(self._crop(cv2.blur(img * img, (self.w, self.w))) - mean**2, 0)
+
+        ring = np.ones((3, 3), dtype=np.uint8)
+        ring[1, 1] = 0
+        neighbours = cv2.dilate(frame, ring).astype(np.float32)
+        spike = self._crop(img >= self.hot_ratio * neighbours + self.hot_offset)
+
+        with self._lock:
+            if self.mean is None or self.mean.shape != mean.shape:
+                self.mean, self.var = mean, var
+                self.hot_score = np.zeros(mean.shape, dtype=np.float32)
+                self._hot_pointing = None
+            else:
+                self.mean = (1 - self.rate) * self.mean + self.rate * mean
+                self.var = (1 - self.rate) * self.var + self.rate * var
+            # stars spike at the same pixels as long as the pointing stays
+            if self._moved(pointing):
+                self.hot_score = (
+                    1 - self.hot_rate
+                ) * self.hot_score + self.hot_rate * spike
+
+            # integer pixel x >= t if and only if x >= ceil(t)
+            threshold = np.ceil(self.mean + self.n_sigma * np.sqrt(self.var))
+            threshold = np.clip(threshold, 0, 256).astype(np.uint16)
+            threshold[self.hot_pixels] = 256
+            self._threshold = threshold
+
+    def normalize(self, frame, pointing=None):
+        """
+        keep pixels above background, like gaussian_window_filter(frame, w)
+
+        Parameters
+        ----------
+        frame : (H, W) uint8 np.ndarray, grayscale frame
+        pointing : (optional) pointing of frame, see update()
+
+        Returns
+        -------
+        img_filtered : (H-w, W-w) uint8 np.ndarray, input for detect_stars()
+        """
+        shape = (frame.shape[0] - self.w, frame.shape[1] - self.w)
+        if (
+            self._threshold is None
+            or self._threshold.shape != shape
+            or self.n_frames % self.update_every == 0
+        ):
+            self.update(frame, pointing)
+        self.n_frames += 1
+
+        img = self._crop(frame)
+        return np.where(img >= self._threshold, img, 0).astype(np.uint8)
+
+    def copy(self):
+        """independent model with the current state, e.g. for another worker"""
+        return copy.deepcopy(self)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        n_hot = int(np.sum(self.hot_pixels))
+        return f"BackgroundModel after {self.n_frames} frames with {n_hot} hot pixels"
@@ -1,5 +1,4 @@
 """Table containing brightest stars per grid cell"""
-from numba.experimental import jitclass
 import numpy as np
 
 # @jitclass
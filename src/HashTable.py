@@ -1,7 +1,10 @@
 """table structure containing star locations and hashcodes"""
-from numba.experimental import jitclass
 import numpy as np
 import pickle
+import os
+
+ARRAYS = ["codes", "origin", "alpha", "scale", "idc"]
+
 
 # @jitclass
 class HashTable:
@@ -67,3 +70,22 @@ class HashTable:
         self.idc = htable.idc
 
         return self
+
+    def save_arrays(self, dirname):
+        """save every array as .npy file in dirname, see load_arrays()"""
+        os.makedirs(dirname, exist_ok=True)
+        for key in ARRAYS:
+            np.save(os.path.join(dirname, key + ".npy"), getattr(self, key))
+
+    def load_arrays(self, dirname, mmap_mode="r"):
+        """
+        load arrays saved by save_arrays(). By default, the arrays are
+        memory-mapped read-only, so that processes loading the same table share
+        its memory instead of copying it.
+        """
+        for key in ARRAYS:
+            path = os.path.join(dirname, key + ".npy")
+            setattr(self, key, np.load(path, mmap_mode=mmap_mode))
+        self.ptr = self.codes.shape[0]
+
+        return self
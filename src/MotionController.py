@@ -0,0 +1,210 @@
+"""host side of the serial velocity protocol of hardware/motion_control"""
+
+import collections
+import threading
+import time
+
+import numpy as np
+
+# constants of hardware/motion_control/motion_control.ino
+BAUDRATE = 921600
+PROMT_UPDATE_TIME = 0.2  # s, how often the firmware reads the serial buffer
+SERIAL_TIMEOUT = 5.0  # s, after which the firmware sets the velocity to zero
+MAX_VEL = 1.0  # DEG/s, axis velocity of a relative velocity of 1
+
+# the firmware loop takes longer than PROMT_UPDATE_TIME plus stepper updates,
+# commands must be spaced further apart to arrive in different loops
+UPDATE_MARGIN = 1.25
+N_STOP = 3  # number of zero velocity commands sent by stop()
+
+
+def _velocity_byte(vel):
+    """relative velocity in [-1, 1] to 'normalized' velocity byte, 128 is zero"""
+    return int(np.clip(np.round(128 + 128 * vel), 0, 255))
+
+
+def encode_velocity(vel_al, vel_az):
+    """
+    encode relative axis velocities as serial command
+
+    One byte per axis, where 0 results in negative maximal velocity, 255 in
+    positive maximal velocity and 128 in zero velocity, followed by a line break.
+
+    Parameters
+    ----------
+    vel_al : float, relative altitude velocity in [-1, 1]
+    vel_az : float, relative azimuth velocity in [-1, 1]
+
+    Returns
+    -------
+    command : bytes of length 3
+    """
+    return bytes([_velocity_byte(vel_al), _velocity_byte(vel_az), ord("\n")])
+
+
+class MotionController:
+    """
+    Non-blocking controller sending velocity commands to the Arduino.
+
+    `set_velocity()` only stores the latest setpoint. A dedicated writer thread
+    sends it at most once per `update_time`, older setpoints that have not been
+    sent yet are dropped (coalesced). The firmware only reads the serial buffer
+    once per loop, which takes longer than PROMT_UPDATE_TIME, and uses the
+    first command it finds, so sending faster would only delay new setpoints.
+    Hence `update_time` defaults to UPDATE_MARGIN * PROMT_UPDATE_TIME. The
+    last command is repeated every
+    `keepalive` seconds to prevent the firmware from stopping after
+    SERIAL_TIMEOUT.
+
+    For every sent setpoint, the latency between the solve result it is based on
+    and the bytes being written to the port is stored in `latency`.
+
+    Attributes:
+    ----------
+        port:        serial port, everything with `write()` (and `flush()`)
+        update_time: float, minimal time between two commands in s
+        keepalive:   float, time after which the last command is repeated in s
+        latency:     deque, latencies of recently sent setpoints in s
+        n_sent:      int, number of sent setpoints
+        n_coalesced: int, number of setpoints replaced before being sent
+    """
+
+    def __init__(
+        self,
+        port,
+        baudrate=BAUDRATE,
+        update_time=UPDATE_MARGIN * PROMT_UPDATE_TIME,
+        keepalive=SERIAL_TIMEOUT / 5,
+        n_latency=1000,
+    ):
+        """
+        port : str with serial device name (opened with pyserial) or binary
+               file-like object, e.g. the slave side of a pty
+        """
+        self._owns_port = isinstance(port, str)
+        if self._owns_port:
+            import serial
+
+            port = serial.Serial(port, baudrate)
+
+        self.port = port
+        self.update_time = update_time
+        self.keepalive = keepalive
+        self.latency = collections.deque(maxlen=n_latency)
+        self.n_sent = 0
+        self.n_coalesced = 0
+
+        self._setpoint = None  # (command, timestamp of solve result)
+        self._last_command = encode_velocity(0, 0)
+        self._t_last_write = -np.inf
+        self._running = False
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def start(self):
+        """start writer thread"""
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._run, name="MotionController", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        stop writer thread and send zero velocity N_STOP times, each in a
+        separate firmware loop such that it cannot be shadowed by an older command
+        """
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        # the firmware ignores all but the first command per update
+        for _ in range(N_STOP):
+            t_next = self._t_last_write + self.update_time
+            time.sleep(max(t_next - time.perf_counter(), 0))
+            self._write(encode_velocity(0, 0))
+        if self._owns_port:
+            self.port.close()
+
+    def set_velocity(self, vel_al, vel_az, t_result=None):
+        """
+        set new velocity setpoint without blocking
+
+        Parameters
+        ----------
+        vel_al : float, relative altitude velocity in [-1, 1]
+        vel_az : float, relative azimuth velocity in [-1, 1]
+        t_result : (optional) time.perf_counter() timestamp of the solve result
+                   the setpoint is based on, used for latency measurement
+        """
+        if t_result is None:
+            t_result = time.perf_counter()
+        command = encode_velocity(vel_al, vel_az)
+        with self._cond:
+            if self._setpoint is not None:
+                self.n_coalesced += 1
+            self._setpoint = (command, t_result)
+            self._cond.notify()
+
+    def latency_stats(self):
+        """mean, median, 95th percentile and maximal latency in s"""
+        if len(self.latency) == 0:
+            return {}
+        lat = np.array(self.latency)
+        return {
+            "mean": float(np.mean(lat)),
+            "p50": float(np.percentile(lat, 50)),
+            "p95": float(np.percentile(lat, 95)),
+            "max": float(np.max(lat)),
+        }
+
+    def _write(self, command):
+        self.port.write(command)
+        flush = getattr(self.port, "flush", None)
+        if flush is not None:
+            flush()  # blocks until bytes are on the wire for pyserial ports
+        self._last_command = command
+        self._t_last_write = time.perf_counter()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # wait for rate limit to pass with new setpoint or for keepalive
+                while self._running:
+                    if self._setpoint is not None:
+                        t_next = self._t_last_write + self.update_time
+                    elif self._t_last_write > -np.inf:
+                        t_next = self._t_last_write + self.keepalive
+                    else:
+                        self._cond.wait()  # nothing to repeat yet
+                        continue
+                    timeout = t_next - time.perf_counter()
+                    if timeout <= 0:
+                        break
+                    self._cond.wait(timeout)
+                if not self._running:
+                    return
+                setpoint, self._setpoint = self._setpoint, None
+
+            if setpoint is None:
+                self._write(self._last_command)
+                continue
+
+            command, t_result = setpoint
+            self._write(command)
+            self.latency.append(self._t_last_write - t_result)
+            self.n_sent += 1
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def __repr__(self):
+        return f"MotionController with {self.n_sent} sent setpoints"
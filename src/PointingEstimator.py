@@ -0,0 +1,162 @@
+"""pointing prediction between plate solves for an alt-az mounted telescope"""
+
+import time
+
+import numpy as np
+
+from src import utils
+
+
+class PointingEstimator:
+    """
+    Pointing state combining the last verified solve with time and motion.
+
+    Between solves, altitude and azimuth only change by the commanded axis
+    rates while the sky drifts at sidereal rate. The pointing is propagated in
+    horizontal coordinates and transformed back to RA/DEC with the local
+    sidereal time. Its uncertainty (one scalar sigma) grows with time (tracking
+    noise) and with the commanded motion (relative rate error):
+
+        sigma^2 = sigma_solve^2 + drift_noise * dt + (rate_error * travel)^2
+
+    A new solve is only required once sigma exceeds `max_sigma`.
+
+    Attributes:
+    ----------
+        latitude:    float, geographic latitude of telescope, in RAD
+        longitude:   float, geographic longitude of telescope (east), in RAD
+        sigma_solve: float, uncertainty of a verified solve, in RAD
+        drift_noise: float, growth of variance while tracking, in RAD^2/s
+        rate_error:  float, relative error of commanded axis rates
+        max_sigma:   float, uncertainty triggering a new solve, in RAD
+    """
+
+    def __init__(
+        self,
+        latitude,
+        longitude,
+        sigma_solve=1e-4,
+        drift_noise=1e-8,
+        rate_error=0.05,
+        max_sigma=1e-3,
+    ):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.sigma_solve = sigma_solve
+        self.drift_noise = drift_noise
+        self.rate_error = rate_error
+        self.max_sigma = max_sigma
+
+        # state at reference time, updated at every solve and rate change
+        self._t_ref = None
+        self._alt_ref = 0.0
+        self._az_ref = 0.0
+        self._var_ref = np.inf
+        self._rates = np.zeros(2)  # (altitude, azimuth) rates in RAD/s
+
+    def update_solve(self, ra, dec, t=None, sigma=None):
+        """
+        reset pointing state to a verified solve
+
+        Parameters
+        ----------
+        ra, dec : float, solved pointing in RAD
+        t : (optional) float, unix time of the exposure, default now
+        sigma : (optional) float, uncertainty of solve, default sigma_solve
+        """
+        t = time.time() if t is None else t
+        ha = utils.local_sidereal_time(t, self.longitude) - ra
+        self._alt_ref, self._az_ref = utils.equatorial_to_horizontal(
+            ha, dec, self.latitude
+        )
+        self._var_ref = (self.sigma_solve if sigma is None else sigma) ** 2
+        self._t_ref = t
+
+    def set_rates(self, rate_al, rate_az, t=None):
+        """
+        set commanded axis rates in RAD/s, effective from time `t` (default now)
+
+        Relative velocities sent by MotionController correspond to
+        `np.deg2rad(MotionController.MAX_VEL) * vel`.
+        """
+        t = time.time() if t is None else t
+        if self._t_ref is not None:
+            self._alt_ref, self._az_ref, self._var_ref = self._propagate(t)
+            self._t_ref = t
+        self._rates = np.array([rate_al, rate_az], dtype=float)
+
+    def _propagate(self, t):
+        """altitude, azimuth and variance at time t"""
+        dt = t - self._t_ref
+        alt = self._alt_ref + self._rates[0] * dt
+        az = self._az_ref + self._rates[1] * dt
+        # azimuth motion moves the pointing by cos(alt) on the sky
+        travel = np.hypot(self._rates[0], self._rates[1] * np.cos(alt)) * abs(dt)
+        var = (
+            self._var_ref + self.drift_noise * abs(dt) + (self.rate_error * travel) ** 2
+        )
+        return alt, az, var
+
+    def predict(self, t=None):
+        """
+        predicted pointing at time t (default now)
+
+        Returns
+        -------
+        ra, dec : float, pointing in RAD
+        sigma : float, uncertainty in RAD, inf before the first solve
+        """
+        if self._t_ref is None:
+            return np.nan, np.nan, np.inf
+        t = time.time() if t is None else t
+        alt, az, var = self._propagate(t)
+        ha, dec = utils.horizontal_to_equatorial(alt, az, self.latitude)
+        ra = np.mod(utils.local_sidereal_time(t, self.longitude) - ha, 2 * np.pi)
+        return ra, dec, np.sqrt(var)
+
+    def needs_solve(self, t=None):
+        """whether the predicted uncertainty exceeds max_sigma"""
+        return self.predict(t)[2] > self.max_sigma
+
+    def prior_window(self, t=None, n_sigma=3, margin=0.0):
+        """
+        window containing the pointing with n_sigma confidence
+
+        Parameters
+        ----------
+        t : (optional) float, unix time, default now
+        n_sigma : float, number of standard deviations
+        margin : float, additional radius in RAD, e.g. half the field of view
+                 to include all stars in the image
+
+        Returns
+        -------
+        ra_start, dec_start, ra_end, dec_end : float, window corners in RAD,
+            in the convention of Grid (ra_start > ra_end) and not wrapped
+            into [0, 2*pi]
+        """
+        ra, dec, sigma = self.predict(t)
+        radius = n_sigma * sigma + margin
+        ra_radius = radius / max(np.cos(dec), 1e-6)  # RA circles shrink at poles
+        return ra + ra_radius, dec - radius, ra - ra_radius, dec + radius
+
+    def window_rows(self, hashtable, t=None, n_sigma=3, margin=0.0):
+        """
+        hashtable rows whose origin lies in the prior window, e.g. for
+        `solver.solve(img, hashtable, rows=...)`
+        """
+        ra_start, dec_start, ra_end, dec_end = self.prior_window(t, n_sigma, margin)
+        if not np.isfinite(ra_start):
+            return np.arange(len(hashtable.codes))  # no solve yet
+        ra_center = (ra_start + ra_end) / 2
+        d_ra = np.mod(hashtable.origin[:, 0] - ra_center + np.pi, 2 * np.pi) - np.pi
+        in_window = (
+            (np.abs(d_ra) <= (ra_start - ra_end) / 2)
+            & (hashtable.origin[:, 1] >= dec_start)
+            & (hashtable.origin[:, 1] <= dec_end)
+        )
+        return np.flatnonzero(in_window)
+
+    def __repr__(self):
+        ra, dec, sigma = self.predict()
+        return f"PointingEstimator at ra={ra:.4f}, dec={dec:.4f}, sigma={sigma:.2e}"
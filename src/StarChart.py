@@ -1,39 +1,123 @@
-from numba.experimental import jitclass
 import numpy as np
+import os
+
+ARRAYS = ["data", "name"]
+NUMERIC = ["ra", "dec", "mag"]  # rows of StarChart.data
+
+
+def _read_names(path, index):
+    """star names of csv (in file order) or name.npy, reordered by index"""
+    if path.endswith(".npy"):
+        names = np.load(path, mmap_mode="r")
+    else:
+        names = np.genfromtxt(
+            path, delimiter=",", skip_header=True, usecols=6, dtype=str
+        )
+    return names if index is None else names[index]
+
 
 # @jitclass
 class StarChart:
-    def __init__(self, path="data/hygdata_v3.csv"):
+    def __init__(self, path="data/hygdata_v3.csv", mag_limit=None):
+        """
+        star catalogue sorted by brightness
+
+        ra, dec (RAD) and mag are rows of one contiguous (3, n) float32 array
+        `data`. The names are only read from the csv when accessed, e.g. by
+        plotting.
+
+        path : csv of HYG database, None for an empty chart
+        mag_limit : (optional) only keep stars with mag <= mag_limit
+        """
         # downloaded from https://github.com/astronexus/HYG-Database
+        self._name = None
+        self._name_path = None
+        self._name_index = None  # rows of name table, None if in same order
+        if path is None:
+            # empty chart, e.g. for load_arrays()
+            self.data = np.zeros((3, 0), dtype=np.float32)
+            self._name = np.zeros(0, dtype=str)
+            return
 
         # read entries
-        self.ra = np.genfromtxt(
-            path, delimiter=",", skip_header=True, usecols=7, dtype=float
-        )
-        self.dec = np.genfromtxt(
-            path, delimiter=",", skip_header=True, usecols=8, dtype=float
-        )
-        self.mag = np.genfromtxt(
-            path, delimiter=",", skip_header=True, usecols=13, dtype=float
-        )
-        self.name = np.genfromtxt(
-            path, delimiter=",", skip_header=True, usecols=6, dtype=str
-        )
+        ra, dec, mag = np.genfromtxt(
+            path, delimiter=",", skip_header=True, usecols=(7, 8, 13), dtype=float
+        ).T
 
         # sort entries by brightness
         # (key step to avoid sorting during selection)
-        sidx = np.argsort(self.mag)
-        self.ra = self.ra[sidx]
-        self.dec = self.dec[sidx]
-        self.mag = self.mag[sidx]
-        self.name = self.name[sidx]
+        sidx = np.argsort(mag)
+        if mag_limit is not None:
+            sidx = sidx[: np.searchsorted(mag[sidx], mag_limit, side="right")]
 
         # convert angles to rad
-        self.ra = np.pi * self.ra / 12
-        self.dec = np.pi * self.dec / 180
+        self.data = np.array(
+            [np.pi * ra[sidx] / 12, np.pi * dec[sidx] / 180, mag[sidx]],
+            dtype=np.float32,
+        )
+        self._name_path = path
+        self._name_index = sidx
+
+    ra = property(lambda self: self.data[0])
+    dec = property(lambda self: self.data[1])
+    mag = property(lambda self: self.data[2])
+
+    @property
+    def name(self):
+        """star names, loaded at first access"""
+        if self._name is None:
+            self._name = _read_names(self._name_path, self._name_index)
+        return self._name
+
+    def select(self, idx):
+        """StarChart with the stars idx (indices or boolean mask) only"""
+        chart = StarChart(None)
+        chart.data = np.ascontiguousarray(self.data[:, idx])
+        if self._name is not None:
+            chart._name = self._name[idx]
+        else:
+            index = self._name_index
+            if index is None or isinstance(index, slice):
+                index = np.arange(len(self))  # same order as name table
+            chart._name_path = self._name_path
+            chart._name_index = index[idx]
+        return chart
+
+    def unit_vectors(self):
+        """(n, 3) float32 np.ndarray with cartesian unit vectors of the stars"""
+        cos_dec = np.cos(self.dec)
+        return np.column_stack(
+            (cos_dec * np.cos(self.ra), cos_dec * np.sin(self.ra), np.sin(self.dec))
+        )
+
+    def save_arrays(self, dirname):
+        """save every array as .npy file in dirname, see load_arrays()"""
+        os.makedirs(dirname, exist_ok=True)
+        for key in ARRAYS:
+            np.save(os.path.join(dirname, key + ".npy"), getattr(self, key))
+
+    def load_arrays(self, dirname, mmap_mode="r", mag_limit=None):
+        """
+        load arrays saved by save_arrays(), memory-mapped read-only by default.
+        Names are only loaded when accessed.
+        """
+        self.data = np.load(os.path.join(dirname, "data.npy"), mmap_mode=mmap_mode)
+        self._name = None
+        self._name_path = os.path.join(dirname, "name.npy")
+        self._name_index = None
+        if mag_limit is not None:
+            n = np.searchsorted(self.mag, mag_limit, side="right")
+            self.data = self.data[:, :n]
+            self._name_index = slice(0, n)
+
+        return self
 
     def __getitem__(self, k):
-        return np.array([self.ra[k], self.dec[k], self.mag[k], self.name[k]])
+        """ra, dec and mag of star(s) k"""
+        return self.data[:, k]
+
+    def __len__(self):
+        return self.data.shape[1]
 
     def __repr__(self):
-        return f"StarChart with {len(self.ra)} entries"
+        return f"StarChart with {len(self)} entries"
@@ -0,0 +1,244 @@
+"""
+solve many images in parallel, e.g. whole nights of archived frames
+
+Star detection, hashing and lookup run in a process pool. The HashTable and
+StarChart are converted once into .npy arrays next to their source files and
+memory-mapped read-only by every worker, so all processes share one copy.
+Results are streamed to a JSON-lines or CSV file as they complete.
+
+usage: python -m src.batch IMAGES_OR_DIRS [--table data/pleiades.hashtable]
+           [--chart data/hygdata_v3.csv] [--out results.jsonl] [--workers N]
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import shutil
+import time
+
+from src import solver
+from src.HashTable import ARRAYS as TABLE_ARRAYS, HashTable
+from src.StarChart import ARRAYS as CHART_ARRAYS, StarChart
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
+CSV_FIELDS = [
+    "path",
+    "n_stars",
+    "row",
+    "distance",
+    "ra",
+    "dec",
+    "alpha",
+    "scale",
+    "img_origin",
+    "img_alpha",
+    "img_scale",
+    "stars",
+    "time",
+    "error",
+]
+
+# per worker process, set by init_worker()
+_hashtable = None
+_star_chart = None
+_window = solver.WINDOW
+
+
+def list_images(paths):
+    """expand directories to sorted lists of contained images"""
+    images = []
+    for path in paths:
+        if os.path.isdir(path):
+            images += sorted(
+                os.path.join(path, f)
+                for f in os.listdir(path)
+                if f.lower().endswith(IMAGE_EXTENSIONS)
+            )
+        else:
+            images.append(path)
+    return images
+
+
+def _is_outdated(arrays_dir, source, keys):
+    """whether any array is missing or older than source"""
+    paths = [os.path.join(arrays_dir, key + ".npy") for key in keys]
+    if not all(os.path.exists(path) for path in paths):
+        return True
+    return min(map(os.path.getmtime, paths)) < os.path.getmtime(source)
+
+
+def _save_arrays(obj, arrays_dir):
+    """
+    save arrays to a temporary directory and move it into place, such that
+    files memory-mapped by running workers are never overwritten
+    """
+    tmp_dir = f"{arrays_dir}.tmp{os.getpid()}"
+    old_dir = f"{arrays_dir}.old{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    obj.save_arrays(tmp_dir)
+    if os.path.isdir(arrays_dir):
+        os.replace(arrays_dir, old_dir)
+    os.replace(tmp_dir, arrays_dir)
+    # mapped files stay valid after unlinking
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+
+def prepare_arrays(table, chart=None):
+    """
+    convert pickled HashTable and StarChart csv to memory-mappable arrays
+
+    The arrays are stored in `<file>.arrays` directories and only rebuilt if the
+    source file changed. Rebuilt arrays replace the directory as a whole, so
+    processes with the old arrays memory-mapped are not affected. Directories
+    are used as they are.
+
+    Returns
+    -------
+    table_dir, chart_dir : str, directories for load_arrays(), chart_dir is
+                           None if no chart is given
+    """
+    table_dir = table
+    if not os.path.isdir(table):
+        table_dir = table + ".arrays"
+        if _is_outdated(table_dir, table, TABLE_ARRAYS):
+            _save_arrays(HashTable().load(table), table_dir)
+
+    chart_dir = chart
+    if chart is not None and not os.path.isdir(chart):
+        chart_dir = chart + ".arrays"
+        if _is_outdated(chart_dir, chart, CHART_ARRAYS):
+            _save_arrays(StarChart(chart), chart_dir)
+
+    return table_dir, chart_dir
+
+
+def init_worker(table_dir, chart_dir, w):
+    """load arrays memory-mapped and warm up kernels, once per worker process"""
+    global _hashtable, _star_chart, _window
+    _hashtable = HashTable().load_arrays(table_dir)
+    if chart_dir is not None:
+        _star_chart = StarChart(None).load_arrays(chart_dir)
+    _window = w
+    solver.warmup(w)
+
+
+def solve_image(image):
+    """
+    solve image path or (H, W) uint8 array in a process set up by init_worker()
+
+    Returns
+    -------
+    result : dict as returned by solver.solve() with additional `stars`, if
+             the star chart is loaded
+
+    Raises
+    ------
+    FileNotFoundError, ValueError : as solver.load_image() and solver.solve()
+    """
+    img = solver.load_image(image) if isinstance(image, str) else image
+    result = solver.solve(img, _hashtable, _window)
+    if _star_chart is not None:
+        star_ids = _hashtable.idc[result["row"]]
+        result["stars"] = [str(name) for name in _star_chart.name[star_ids]]
+    return result
+
+
+def _solve_path(path):
+    t_start = time.perf_counter()
+    try:
+        result = solve_image(path)
+    except (FileNotFoundError, ValueError) as err:
+        result = {"error": str(err)}
+    except Exception as err:
+        # e.g. cv2.error, a single image must not abort the whole run
+        result = {"error": f"{type(err).__name__}: {err}"}
+    result["path"] = path
+    result["time"] = time.perf_counter() - t_start
+    return result
+
+
+class _ResultWriter:
+    """write results line by line as JSON or CSV, depending on file extension"""
+
+    def __init__(self, file, filename):
+        self.file = file
+        self.csv = None
+        if filename.lower().endswith(".csv"):
+            self.csv = csv.DictWriter(file, CSV_FIELDS, extrasaction="ignore")
+            self.csv.writeheader()
+
+    def write(self, result):
+        if self.csv is None:
+            self.file.write(json.dumps(result) + "\n")
+        else:
+            self.csv.writerow(
+                {
+                    key: " ".join(map(str, val)) if isinstance(val, list) else val
+                    for key, val in result.items()
+                }
+            )
+        self.file.flush()
+
+
+def solve_batch(paths, table_dir, chart_dir=None, workers=None, w=solver.WINDOW):
+    """
+    solve images in a process pool, yielding results as they complete
+
+    Parameters
+    ----------
+    paths : list of image paths
+    table_dir : directory with HashTable arrays, see prepare_arrays()
+    chart_dir : (optional) directory with StarChart arrays, adds star names
+    workers : (optional) number of processes, default number of cores
+    w : width of gaussian window filter
+
+    Yields
+    -------
+    result : dict as returned by solver.solve() with additional `path`, `time`
+             and, if star chart is given, `stars`. Failed images only have
+             `path`, `time` and `error`.
+    """
+    # a failing pool initializer would restart the workers forever
+    solver.check_window(w)
+    with multiprocessing.Pool(workers, init_worker, (table_dir, chart_dir, w)) as pool:
+        yield from pool.imap_unordered(_solve_path, paths)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("images", nargs="+", help="image files or directories")
+    parser.add_argument("--table", default="data/pleiades.hashtable")
+    parser.add_argument("--chart", default=None, help="StarChart csv for names")
+    parser.add_argument("--out", default="results.jsonl", help=".jsonl or .csv")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--window", type=int, default=solver.WINDOW)
+    args = parser.parse_args(argv)
+    try:
+        solver.check_window(args.window)
+    except ValueError as err:
+        parser.error(str(err))
+
+    paths = list_images(args.images)
+    table_dir, chart_dir = prepare_arrays(args.table, args.chart)
+
+    t_start = time.perf_counter()
+    n_failed = 0
+    with open(args.out, "w", newline="") as file:
+        writer = _ResultWriter(file, args.out)
+        for result in solve_batch(
+            paths, table_dir, chart_dir, args.workers, args.window
+        ):
+            writer.write(result)
+            n_failed += "error" in result
+    duration = time.perf_counter() - t_start
+
+    print(
+        f"[batch] solved {len(paths) - n_failed}/{len(paths)} images in "
+        f"{duration:.1f}s ({len(paths) / duration:.2f} images/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
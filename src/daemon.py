@@ -0,0 +1,262 @@
+"""
+long-running local solver keeping hashtable and star chart resident
+
+The HashTable and StarChart are memory-mapped once (see batch.prepare_arrays())
+and shared by a pool of warm worker processes, whose kernels are compiled or
+loaded before the first request. Solve requests are served over localhost HTTP:
+
+    POST /solve                     {"path": "image.jpg"}
+    POST /solve?height=H&width=W    raw uint8 grayscale pixels
+                                    (Content-Type: application/octet-stream)
+    GET  /metrics                   queue depth, request counts and latencies
+
+usage: python -m src.daemon [--table data/pleiades.hashtable]
+           [--chart data/hygdata_v3.csv] [--port 8765] [--workers N]
+"""
+
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from src import batch
+from src import solver
+from src import utils
+
+PORT = 8765
+STARTUP_TIMEOUT = 300  # s, for loading arrays and compiling kernels
+
+
+def _solve(image):
+    """batch.solve_image() with time spent in the worker process"""
+    t_start = time.perf_counter()
+    result = batch.solve_image(image)
+    result["solve_time"] = time.perf_counter() - t_start
+    return result
+
+
+def _wait_for_workers(barrier):
+    """blocks until every worker runs one, i.e. all are initialized"""
+    barrier.wait(STARTUP_TIMEOUT)
+
+
+class SolverDaemon:
+    """
+    Pool of warm solver processes sharing one memory-mapped hashtable.
+
+    `solve()` is thread-safe and blocks until the result is available, so it
+    can be called from the request threads of the HTTP server.
+
+    Attributes:
+    ----------
+        workers:     int, number of solver processes
+        latency:     deque, recent request latencies (queue + solve) in s
+        n_completed: int, number of solved requests
+        n_failed:    int, number of failed requests
+    """
+
+    def __init__(self, table, chart=None, workers=None, w=solver.WINDOW):
+        """
+        table : pickled HashTable file or directory from HashTable.save_arrays()
+        chart : (optional) StarChart csv or directory, adds names of hash stars
+        """
+        solver.check_window(w)
+        table_dir, chart_dir = batch.prepare_arrays(table, chart)
+        self.workers = os.cpu_count() if workers is None else workers
+        self.pool = ProcessPoolExecutor(
+            self.workers,
+            initializer=batch.init_worker,
+            initargs=(table_dir, chart_dir, w),
+        )
+        self.latency = collections.deque(maxlen=1000)
+        self.n_completed = 0
+        self.n_failed = 0
+        self._n_pending = 0
+        self._t_start = time.perf_counter()
+        self._lock = threading.Lock()
+
+        # a task per worker waiting for all others can only complete once every
+        # worker is running, i.e. has loaded the arrays and compiled the kernels
+        with multiprocessing.Manager() as manager:
+            barrier = manager.Barrier(self.workers)
+            futures = [
+                self.pool.submit(_wait_for_workers, barrier)
+                for _ in range(self.workers)
+            ]
+            for future in futures:
+                future.result()
+
+    def solve(self, image):
+        """
+        solve image path (str) or (H, W) uint8 array in a worker process
+
+        Returns
+        -------
+        result : dict as from solver.solve() with additional `solve_time`,
+                 `latency` and, if star chart is given, `stars`
+
+        Raises
+        ------
+        FileNotFoundError, ValueError : as solver.load_image() and solver.solve(),
+                                        other exceptions of the worker are passed on
+        """
+        t_start = time.perf_counter()
+        with self._lock:
+            self._n_pending += 1
+        try:
+            result = self.pool.submit(_solve, image).result()
+        except Exception:
+            with self._lock:
+                self.n_failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._n_pending -= 1
+        result["latency"] = time.perf_counter() - t_start
+        with self._lock:
+            self.n_completed += 1
+            self.latency.append(result["latency"])
+        return result
+
+    def metrics(self):
+        """queue depth, request counts and latency statistics in s"""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_depth": max(self._n_pending - self.workers, 0),
+                "running": min(self._n_pending, self.workers),
+                "completed": self.n_completed,
+                "failed": self.n_failed,
+                "uptime": time.perf_counter() - self._t_start,
+                "latency": utils.latency_stats(self.latency),
+            }
+
+    def serve(self, host="127.0.0.1", port=PORT):
+        """serve requests over HTTP until interrupted"""
+        server = ThreadingHTTPServer((host, port), _RequestHandler)
+        server.daemon_threads = True
+        server.solver_daemon = self
+        print(f"[daemon] {self.workers} workers listening on http://{host}:{port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.close()
+
+    def close(self):
+        self.pool.shutdown()
+
+    def __repr__(self):
+        return f"SolverDaemon with {self.workers} workers"
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    def _reply(self, status, content):
+        body = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urllib.parse.urlparse(self.path).path == "/metrics":
+            self._reply(200, self.server.solver_daemon.metrics())
+        else:
+            self._reply(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        url = urllib.parse.urlparse(self.path)
+        if url.path != "/solve":
+            self._reply(404, {"error": f"unknown path {self.path}"})
+            return
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        try:
+            if self.headers.get("Content-Type") == "application/octet-stream":
+                query = urllib.parse.parse_qs(url.query)
+                shape = (int(query["height"][0]), int(query["width"][0]))
+                image = np.frombuffer(body, dtype=np.uint8).reshape(shape)
+            else:
+                image = str(json.loads(body)["path"])
+        except (KeyError, TypeError, ValueError) as err:
+            self._reply(400, {"error": f"invalid request: {err}"})
+            return
+
+        try:
+            self._reply(200, self.server.solver_daemon.solve(image))
+        except FileNotFoundError as err:
+            self._reply(404, {"error": str(err)})
+        except ValueError as err:
+            self._reply(422, {"error": str(err)})
+        except Exception as err:
+            self._reply(500, {"error": f"{type(err).__name__}: {err}"})
+
+    def log_message(self, format, *args):
+        pass  # one line per request would dominate the output
+
+
+def request_solve(image, url=f"http://127.0.0.1:{PORT}"):
+    """
+    client for a running daemon
+
+    Parameters
+    ----------
+    image : str with image path (as seen by the daemon) or (H, W) uint8 array
+    url : address of daemon
+
+    Returns
+    -------
+    result : dict, see SolverDaemon.solve(), or with `error` on failure
+    """
+    if isinstance(image, str):
+        request = urllib.request.Request(
+            url + "/solve",
+            data=json.dumps({"path": os.path.abspath(image)}).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+    else:
+        image = np.ascontiguousarray(image, dtype=np.uint8)
+        request = urllib.request.Request(
+            f"{url}/solve?height={image.shape[0]}&width={image.shape[1]}",
+            data=image.tobytes(),
+            headers={"Content-Type": "application/octet-stream"},
+        )
+    try:
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as err:
+        return json.loads(err.read())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--table", default="data/pleiades.hashtable")
+    parser.add_argument("--chart", default=None, help="StarChart csv for names")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--window", type=int, default=solver.WINDOW)
+    args = parser.parse_args(argv)
+    try:
+        solver.check_window(args.window)
+    except ValueError as err:
+        parser.error(str(err))
+
+    daemon = SolverDaemon(args.table, args.chart, args.workers, args.window)
+    daemon.serve(args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
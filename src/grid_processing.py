@@ -97,7 +97,8 @@ def permute_and_hash(sc, grid_stars, i_ra, i_dec):
                             [sc.ra[i_b], sc.dec[i_b]],
                             [sc.ra[i_c], sc.dec[i_c]],
                             [sc.ra[i_d], sc.dec[i_d]],
-                        ]
+                        ],
+                        dtype=float,  # hash in double precision, chart is float32
                     )
                     code, origin, alpha, scale = hsh.generate_quad_code(
                         pos, return_geometry=True
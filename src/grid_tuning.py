@@ -0,0 +1,364 @@
+"""
+search Grid parameters trading hashtable size against solve rate
+
+For every combination of (n_ra, n_dec, n_brgh, depth), a hashtable is built on
+a small sky region and a set of frames is solved with voting. Table bytes,
+build time, lookup latency and solve success are recorded and the Pareto-optimal
+configurations are reported. Trials run in parallel processes.
+
+Early stopping:
+ - configurations whose estimated table size exceeds `max_bytes` are not built
+ - a trial stops after `n_probe` frames if its success rate is below `min_success`
+
+usage: python -m src.grid_tuning --region 1.02 0.40 0.98 0.44 [--chart data/hygdata_v3.csv]
+           [--n-ra 3 5] [--n-dec 3 5] [--n-brgh 2 3 4] [--depth 1 2 3] [--frames 20]
+           [--recorded frames.csv] [--out tuning.jsonl]
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import time
+
+import numpy as np
+
+from src import grid_processing as gp
+from src import voting
+from src.HashTable import HashTable
+from src.StarChart import StarChart
+
+ROW_BYTES = sum(
+    arr.nbytes for arr in vars(HashTable(1)).values() if hasattr(arr, "nbytes")
+)
+OBJECTIVES = {  # direction of optimization
+    "table_bytes": "min",
+    "build_time": "min",
+    "lookup_time": "min",
+    "success": "max",
+}
+
+_star_chart = None  # per worker process, set by _init_worker()
+
+
+def estimate_rows(grid_spec):
+    """upper bound of hashtable rows, every cell holding n_brgh stars"""
+    return sum(
+        (grid_spec["n_ra"] * 2**d - 1)
+        * (grid_spec["n_dec"] * 2**d - 1)
+        * grid_spec["n_brgh"] ** 4
+        for d in range(grid_spec["depth"])
+    )
+
+
+def table_bytes(htable):
+    return sum(arr.nbytes for arr in vars(htable).values() if hasattr(arr, "nbytes"))
+
+
+def crop_star_chart(star_chart, region, margin=0.0):
+    """StarChart with the stars in region (ra_start, dec_start, ra_end, dec_end) only"""
+    ra_start, dec_start, ra_end, dec_end = region
+    inside = (
+        (star_chart.ra <= ra_start + margin)
+        & (star_chart.ra >= ra_end - margin)
+        & (star_chart.dec >= dec_start - margin)
+        & (star_chart.dec <= dec_end + margin)
+    )
+    return star_chart.select(inside)
+
+
+def synthetic_frames(
+    star_chart, region, n_frames, fov, n_stars=20, pixels=1000, noise=0.5, seed=0
+):
+    """
+    detected stars of simulated frames at random pointings in region
+
+    Star positions are the catalogue positions rotated by a random angle,
+    scaled to `pixels` per fov and disturbed by `noise` pixels.
+
+    Returns
+    -------
+    frames : list of (star_pos, star_brightness, img_center, truth) tuples,
+             truth is the (ra, dec) of the image center
+
+    Raises
+    ------
+    ValueError : if too few pointings hold 4 stars, i.e. the region or the
+                 magnitude limit of the chart is too sparse
+    """
+    rng = np.random.default_rng(seed)
+    ra_start, dec_start, ra_end, dec_end = region
+    pixel_scale = fov / pixels
+    frames = []
+    for _ in range(100 * n_frames):
+        if len(frames) == n_frames:
+            break
+        ra = rng.uniform(ra_end + fov / 2, ra_start - fov / 2)
+        dec = rng.uniform(dec_start + fov / 2, dec_end - fov / 2)
+        # stars are sorted by brightness
+        in_fov = np.flatnonzero(
+            (np.abs(star_chart.ra - ra) < fov / 2)
+            & (np.abs(star_chart.dec - dec) < fov / 2)
+        )[:n_stars]
+        if len(in_fov) < 4:
+            continue
+
+        rotation = rng.uniform(0, 2 * np.pi)
+        cos, sin = np.cos(-rotation), np.sin(-rotation)
+        offset = np.column_stack(
+            (star_chart.ra[in_fov] - ra, star_chart.dec[in_fov] - dec)
+        )
+        star_pos = (
+            pixels / 2 + (offset @ np.array([[cos, sin], [-sin, cos]])) / pixel_scale
+        )
+        star_pos += rng.normal(0, noise, star_pos.shape)
+        img_center = np.array([pixels / 2, pixels / 2])
+        frames.append((star_pos, -star_chart.mag[in_fov], img_center, (ra, dec)))
+    if len(frames) < n_frames:
+        raise ValueError(
+            f"only {len(frames)} of {n_frames} frames with 4 stars found, region"
+            " or magnitude limit too sparse"
+        )
+    return frames
+
+
+def recorded_frames(filename, w=25):
+    """
+    detected stars of recorded images from csv with columns path, ra, dec,
+    where ra and dec (RAD) are the known pointing of the image center
+
+    The detected star coordinates must have the handedness of (ra, dec), see voting.
+    """
+    from src import solver
+    from src import star_detection as sd
+
+    frames = []
+    with open(filename, newline="") as file:
+        for row in csv.DictReader(file):
+            img = solver.load_image(row["path"])
+            star_pos, star_brightness = sd.detect_stars(
+                sd.gaussian_window_filter(img, w)
+            )
+            img_center = (np.array(img.shape) - w) / 2
+            frames.append(
+                (
+                    star_pos,
+                    star_brightness,
+                    img_center,
+                    (float(row["ra"]), float(row["dec"])),
+                )
+            )
+    return frames
+
+
+def _init_worker(star_chart):
+    global _star_chart
+    _star_chart = star_chart
+
+
+def run_trial(grid_spec, frames, tolerance, n_probe=5, min_success=0.2, pos_bin=None):
+    """
+    build hashtable for grid_spec and solve frames with voting
+
+    A frame is solved if the best hypothesis is within `tolerance` (RAD) of
+    the true pointing. The trial stops after n_probe frames if fewer than
+    min_success of them were solved.
+
+    Returns
+    -------
+    result : dict with grid_spec, table_bytes, build_time, mean lookup_time,
+             success rate, number of evaluated frames and whether the trial
+             was stopped early
+    """
+    pos_bin = tolerance if pos_bin is None else pos_bin
+    result = dict(grid_spec)
+
+    t_start = time.perf_counter()
+    try:
+        htable = gp.build_hashtable(_star_chart, grid_spec)
+    except RuntimeError as err:
+        return {**result, "error": str(err)}
+    result["build_time"] = time.perf_counter() - t_start
+    result["table_bytes"] = table_bytes(htable)
+
+    n_solved = 0
+    lookup_times = []
+    for i_frame, (star_pos, star_brightness, img_center, truth) in enumerate(frames):
+        t_lookup = time.perf_counter()
+        hypotheses = voting.pointing_hypotheses(
+            star_pos, star_brightness, htable, img_center, top_k=1, pos_bin=pos_bin
+        )
+        lookup_times.append(time.perf_counter() - t_lookup)
+        if hypotheses:
+            d_ra = (hypotheses[0]["ra"] - truth[0]) * np.cos(truth[1])
+            d_dec = hypotheses[0]["dec"] - truth[1]
+            n_solved += np.hypot(d_ra, d_dec) <= tolerance
+        if i_frame + 1 == n_probe and n_solved < min_success * n_probe:
+            break  # early stopping
+
+    result["lookup_time"] = float(np.mean(lookup_times))
+    result["success"] = float(n_solved / len(lookup_times))
+    result["n_frames"] = len(lookup_times)
+    result["stopped"] = len(lookup_times) < len(frames)
+    return result
+
+
+def _run_trial(args):
+    return run_trial(*args)
+
+
+def pareto_front(results):
+    """
+    results which are not dominated in any of the OBJECTIVES, only complete
+    trials which solved at least one frame are considered
+    """
+    valid = [
+        r for r in results if "error" not in r and not r["stopped"] and r["success"] > 0
+    ]
+    # sign such that smaller is better for every objective
+    costs = np.array(
+        [[r[k] if d == "min" else -r[k] for k, d in OBJECTIVES.items()] for r in valid]
+    ).reshape(len(valid), len(OBJECTIVES))
+    front = []
+    for i, cost in enumerate(costs):
+        dominated = np.any(np.all(costs <= cost, axis=1) & np.any(costs < cost, axis=1))
+        if not dominated:
+            front.append(valid[i])
+    return sorted(front, key=lambda r: r["table_bytes"])
+
+
+def tune(
+    star_chart,
+    region,
+    param_space,
+    frames,
+    tolerance,
+    max_bytes=2**30,
+    workers=None,
+    n_probe=5,
+    min_success=0.2,
+):
+    """
+    evaluate all combinations of param_space in parallel trials
+
+    Parameters
+    ----------
+    star_chart : StarChart object
+    region : (ra_start, dec_start, ra_end, dec_end) of grid in RAD
+    param_space : dict with lists of values for n_ra, n_dec, n_brgh and depth
+    frames : list of frames, see synthetic_frames()
+    tolerance : maximal pointing error of a solved frame in RAD
+    max_bytes : configurations with a larger estimated table are skipped
+    workers : number of processes, default number of cores
+    n_probe, min_success : early stopping, see run_trial()
+
+    Yields
+    -------
+    result : dict, see run_trial(), in order of completion
+
+    Raises
+    ------
+    ValueError : if frames is empty, before any trial is started
+    """
+    if len(frames) == 0:
+        raise ValueError("no frames to evaluate trials on")
+    ra_start, dec_start, ra_end, dec_end = region
+    specs = []
+    for n_ra, n_dec, n_brgh, depth in itertools.product(
+        param_space["n_ra"],
+        param_space["n_dec"],
+        param_space["n_brgh"],
+        param_space["depth"],
+    ):
+        spec = {
+            "ra_start": ra_start,
+            "dec_start": dec_start,
+            "ra_end": ra_end,
+            "dec_end": dec_end,
+            "n_ra": n_ra,
+            "n_dec": n_dec,
+            "n_brgh": n_brgh,
+            "depth": depth,
+        }
+        if estimate_rows(spec) * ROW_BYTES > max_bytes:
+            print(f"[grid_tuning] skipping {spec}, table exceeds {max_bytes} bytes")
+            continue
+        specs.append(spec)
+
+    cropped = crop_star_chart(star_chart, region)
+    trials = [(spec, frames, tolerance, n_probe, min_success) for spec in specs]
+    with multiprocessing.Pool(workers, _init_worker, (cropped,)) as pool:
+        yield from pool.imap_unordered(_run_trial, trials)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chart", default="data/hygdata_v3.csv")
+    parser.add_argument("--mag-limit", type=float, default=None)
+    parser.add_argument(
+        "--region",
+        type=float,
+        nargs=4,
+        required=True,
+        metavar=("RA_START", "DEC_START", "RA_END", "DEC_END"),
+    )
+    parser.add_argument("--n-ra", type=int, nargs="+", default=[3, 5, 8])
+    parser.add_argument("--n-dec", type=int, nargs="+", default=[3, 5, 8])
+    parser.add_argument("--n-brgh", type=int, nargs="+", default=[2, 3, 4, 5])
+    parser.add_argument("--depth", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--frames", type=int, default=20, help="synthetic frames")
+    parser.add_argument("--fov", type=float, default=0.02, help="RAD")
+    parser.add_argument("--recorded", default=None, help="csv with path, ra, dec")
+    parser.add_argument("--tolerance", type=float, default=None, help="RAD")
+    parser.add_argument("--max-bytes", type=float, default=2**30)
+    parser.add_argument("--n-probe", type=int, default=5, help="early stopping")
+    parser.add_argument("--min-success", type=float, default=0.2)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--out", default="tuning.jsonl")
+    args = parser.parse_args(argv)
+
+    star_chart = StarChart(args.chart, args.mag_limit)
+    tolerance = args.fov / 20 if args.tolerance is None else args.tolerance
+    if args.recorded is None:
+        frames = synthetic_frames(star_chart, args.region, args.frames, args.fov)
+    else:
+        frames = recorded_frames(args.recorded)
+        if len(frames) == 0:
+            parser.error(f"no frames in {args.recorded}")
+    param_space = {
+        "n_ra": args.n_ra,
+        "n_dec": args.n_dec,
+        "n_brgh": args.n_brgh,
+        "depth": args.depth,
+    }
+
+    results = []
+    with open(args.out, "w") as file:
+        for result in tune(
+            star_chart,
+            args.region,
+            param_space,
+            frames,
+            tolerance,
+            args.max_bytes,
+            args.workers,
+            args.n_probe,
+            args.min_success,
+        ):
+            file.write(json.dumps(result) + "\n")
+            file.flush()
+            results.append(result)
+
+    print("[grid_tuning] pareto-optimal configurations:")
+    print(" n_ra n_dec n_brgh depth | table [MB] build [s] lookup [ms] success frames")
+    for r in pareto_front(results):
+        print(
+            f" {r['n_ra']:4d} {r['n_dec']:5d} {r['n_brgh']:6d} {r['depth']:5d} |"
+            f" {r['table_bytes'] / 1e6:10.2f} {r['build_time']:9.2f}"
+            f" {1e3 * r['lookup_time']:11.2f} {r['success']:7.2f} {r['n_frames']:6d}"
+        )
+
+
+if __name__ == "__main__":
+    main()
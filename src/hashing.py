@@ -1,8 +1,7 @@
 """functions for generating hashcodes for star quadruples"""
 
+from itertools import combinations
 import numpy as np
-import numba as nb
-import matplotlib.pyplot as plt
 
 norm = np.linalg.norm
 
@@ -135,6 +134,9 @@ def generate_quad_code(star_pos, return_geometry=False):
             & (norm(raw_code[[2, 3]] - np.array([1, 1])) <= np.sqrt(2))
         )
     ):
+        # debug plots, pyplot is only imported here to keep solver startup fast
+        import matplotlib.pyplot as plt
+
         print(raw_code, star_pos, A, B, C, D, B_norm)
         print(
             norm(raw_code[[0, 1]]),
@@ -200,3 +202,34 @@ def generate_hash_codes(star_pos, star_brightness):
                         _star_pos[[i_a, i_b, i_c, i_d]], return_geometry=True
                     )
     return code, origin, alpha, scale
+
+
+def generate_all_hash_codes(star_pos, star_brightness, max_stars=10):
+    """
+    generate codes for all quadruples of the brightest stars
+
+    Parameters
+    ----------
+    star_pos : (n,2) np.ndarray with star coordinates
+    star_brightness : (n,) np.ndarray with star brightness
+    max_stars : number of brightest stars to use, C(max_stars, 4) quads
+
+    Returns
+    -------
+    codes : (m,4) np.ndarray with hash codes
+    origin : (m,2) np.ndarray with origins of local coordinate systems
+    alpha : (m,) np.ndarray with rotation angles
+    scale : (m,) np.ndarray with normalization factors
+    """
+    brightest = star_pos[np.argsort(star_brightness)[::-1][:max_stars]]
+    quads = list(combinations(range(len(brightest)), 4))
+
+    codes = np.zeros((len(quads), 4))
+    origin = np.zeros((len(quads), 2))
+    alpha = np.zeros(len(quads))
+    scale = np.zeros(len(quads))
+    for i, quad in enumerate(quads):
+        codes[i], origin[i], alpha[i], scale[i] = generate_quad_code(
+            brightest[list(quad)], return_geometry=True
+        )
+    return codes, origin, alpha, scale
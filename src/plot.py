@@ -1,5 +1,6 @@
 import numpy as np
 from matplotlib import pyplot as plt
+from matplotlib.collections import EllipseCollection, LineCollection
 from copy import deepcopy
 
 # https://www.astronomy.ohio-state.edu/ryden.1/ast162_2/notes9.html
@@ -9,13 +10,63 @@ BETELGEUSE_MAG = 0.58
 FIGSIZE_INCH = 12  # figure is square
 FIG_DPI = 150
 
+MIN_MARKER_SIZE = 0.1  # points^2, smaller stars are not drawn
+MAX_LABELS = 100  # names of the brightest stars in fov only
+
+
+def offscreen_figure(figsize=FIGSIZE_INCH, dpi=FIG_DPI):
+    """
+    figure rendered by Agg without pyplot, e.g. for live monitoring overlays.
+    Save with fig.savefig("*.png") or get pixels with render_rgba(fig)
+
+    Returns
+    -------
+    fig, ax of plot
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    with plt.style.context("dark_background"):
+        fig = Figure(figsize=(figsize, figsize), dpi=dpi)
+        FigureCanvasAgg(fig)
+        ax = fig.subplots()
+    return fig, ax
+
+
+def render_rgba(fig):
+    """draw off-screen figure and return its pixels as (H, W, 4) uint8 array"""
+    fig.canvas.draw()
+    return np.asarray(fig.canvas.buffer_rgba())
+
+
+def _visible(ax, x=None, y=None):
+    """mask of coordinates inside the view limits, autoscaling axes are not culled"""
+    visible = np.ones(len(x) if x is not None else len(y), dtype=bool)
+    if x is not None and not ax.get_autoscalex_on():
+        xmin, xmax = np.sort(ax.get_xlim())
+        visible &= (x >= xmin) & (x <= xmax)
+    if y is not None and not ax.get_autoscaley_on():
+        ymin, ymax = np.sort(ax.get_ylim())
+        visible &= (y >= ymin) & (y <= ymax)
+    return visible
+
 
 def plot_star_selection(
-    sc, ra_center, dec_center, fov, deg_ticks=False, tan_proj=False
+    sc,
+    ra_center,
+    dec_center,
+    fov,
+    deg_ticks=False,
+    tan_proj=False,
+    ax=None,
+    max_labels=MAX_LABELS,
 ):
     """
     draw stars in fov around center
 
+    Stars with markers smaller than MIN_MARKER_SIZE are skipped and only the
+    `max_labels` brightest named stars are labeled.
+
     Parameters
     ----------
     sc:         StarChart object
@@ -24,6 +75,8 @@ def plot_star_selection(
     fov:        field of view (rad)
     deg_ticks:  whether to write ticks in deg instead of rad
     tan_proj:   wheter to use tangential projection
+    ax:         (optional) axis to draw on, e.g. from offscreen_figure()
+    max_labels: maximal number of star names, None for all
 
     Returns
     -------
@@ -50,39 +103,42 @@ def plot_star_selection(
     )
     points_in_fov = FIGSIZE_INCH * FIG_DPI
     size = 1e3 * 4 * points_in_fov * relative_size
+    visible = size >= MIN_MARKER_SIZE
 
     if tan_proj == True:
         ra = np.tan(ra - ra_center) + ra_center
         dec = np.tan(dec - dec_center) + dec_center
 
-    plt.style.use("dark_background")
-    fig, ax = plt.subplots(figsize=(FIGSIZE_INCH, FIGSIZE_INCH), dpi=FIG_DPI)
-    ax.set_xlim(ra_center - fov / 2, ra_center + fov / 2)
-    ax.set_ylim(dec_center - fov / 2, dec_center + fov / 2)
-    ax.scatter(ra, dec, s=size, c="w")
-    ax.set_ylabel("dec [rad]")
-    ax.set_xlabel("ra [rad]")
-    ax.invert_xaxis()  # ra coordinates point from west to east
-    ax.set_aspect("equal")
-
-    if deg_ticks == True:
-        xticks = ax.get_xticks()
-        yticks = ax.get_yticks()
-        ax.set_xticks(
-            xticks, [f"{ang:.3f}°" for ang in xticks * 180 / np.pi], rotation=-30
-        )
-        ax.set_yticks(yticks, [f"{ang:.3f}°" for ang in yticks * 180 / np.pi])
-        ax.set_ylabel("dec [deg]")
-        ax.set_xlabel("ra [deg]")
-
-    # add names
-    names = sc.name[choice]
-    for i, name in enumerate(names):
-        if name is not np.nan:
-            # plt.text(X[i], Y[i], name)
-            plt.text(ra[i], dec[i], name)
-
-    return fig, ax
+    if ax is None:
+        plt.style.use("dark_background")
+        fig, ax = plt.subplots(figsize=(FIGSIZE_INCH, FIGSIZE_INCH), dpi=FIG_DPI)
+
+    with plt.style.context("dark_background"):
+        ax.set_xlim(ra_center - fov / 2, ra_center + fov / 2)
+        ax.set_ylim(dec_center - fov / 2, dec_center + fov / 2)
+        ax.scatter(ra[visible], dec[visible], s=size[visible], c="w")
+        ax.set_ylabel("dec [rad]")
+        ax.set_xlabel("ra [rad]")
+        ax.invert_xaxis()  # ra coordinates point from west to east
+        ax.set_aspect("equal")
+
+        if deg_ticks == True:
+            xticks = ax.get_xticks()
+            yticks = ax.get_yticks()
+            ax.set_xticks(
+                xticks, [f"{ang:.3f}°" for ang in xticks * 180 / np.pi], rotation=-30
+            )
+            ax.set_yticks(yticks, [f"{ang:.3f}°" for ang in yticks * 180 / np.pi])
+            ax.set_ylabel("dec [deg]")
+            ax.set_xlabel("ra [deg]")
+
+        # add names, stars are sorted by brightness
+        names = sc.name[choice]
+        named = np.flatnonzero(names != "")[:max_labels]
+        for i in named:
+            ax.text(ra[i], dec[i], names[i])
+
+    return ax.figure, ax
 
 
 def highlight_grid_stars(ax, hashtable, starchart, r_circ=0.001):
@@ -97,11 +153,23 @@ def highlight_grid_stars(ax, hashtable, starchart, r_circ=0.001):
     r_circ : (optional) circle radius
     """
     idx_brightest = np.unique(hashtable.idc)
-
-    for i_star in idx_brightest:
-        ra = starchart.ra[i_star]
-        dec = starchart.dec[i_star]
-        ax.add_patch(plt.Circle((ra, dec), r_circ, color="pink", fill=False, alpha=0.5))
+    ra = starchart.ra[idx_brightest]
+    dec = starchart.dec[idx_brightest]
+    visible = _visible(ax, ra, dec)
+
+    # one collection instead of one patch per star
+    circles = EllipseCollection(
+        2 * r_circ,
+        2 * r_circ,
+        0,
+        units="xy",
+        offsets=np.column_stack((ra[visible], dec[visible])),
+        transOffset=ax.transData,
+        facecolors="none",
+        edgecolors="pink",
+        alpha=0.5,
+    )
+    ax.add_collection(circles)
 
 
 def draw_grid_cells(ax, grid):
@@ -129,11 +197,21 @@ def draw_grid_cells(ax, grid):
         grid_ra = _grid.ra_start + np.arange(0, _grid.n_ra + 1) * _grid.ra_width
         grid_dec = _grid.dec_start + np.arange(0, _grid.n_dec + 1) * _grid.dec_width
 
-        # plot grid
-        for ra in grid_ra:
-            ax.axvline(ra, np.pi, -np.pi, **kwargs)
-        for dec in grid_dec:
-            ax.axhline(dec, np.pi, -np.pi, **kwargs)
+        # plot grid as one collection per direction, lines span the whole axis
+        grid_ra = grid_ra[_visible(ax, x=grid_ra)]
+        grid_dec = grid_dec[_visible(ax, y=grid_dec)]
+        vertical = np.zeros((len(grid_ra), 2, 2))  # (line, point, xy)
+        vertical[:, :, 0] = grid_ra[:, None]
+        vertical[:, 1, 1] = 1
+        horizontal = np.zeros((len(grid_dec), 2, 2))
+        horizontal[:, :, 1] = grid_dec[:, None]
+        horizontal[:, 1, 0] = 1
+        ax.add_collection(
+            LineCollection(vertical, transform=ax.get_xaxis_transform(), **kwargs)
+        )
+        ax.add_collection(
+            LineCollection(horizontal, transform=ax.get_yaxis_transform(), **kwargs)
+        )
 
         _grid = _grid.descend()
 
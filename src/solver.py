@@ -0,0 +1,139 @@
+"""
+fast-start entry point for locating camera images in the reference hashtable
+
+Only numpy and numba are imported at module level. OpenCV is imported when an
+image is read or stars are detected, matplotlib only by the debug plots in
+`hashing`. The numba kernels are cached on disk (`cache=True`), so only the
+first process after a code change compiles them; `warmup()` loads them before
+the first frame arrives.
+
+usage: python -m src.solver IMAGE [--table data/pleiades.hashtable] [--window 25]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from src import hashing as hsh
+from src import star_detection as sd
+from src.HashTable import HashTable
+
+WINDOW = 25  # width of gaussian window filter in pixels, must be odd
+
+
+def load_image(path):
+    """read image from disk as grayscale uint8 array"""
+    import cv2
+
+    img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        raise FileNotFoundError(f"could not read image {path}")
+    return img
+
+
+def check_window(w):
+    """raise ValueError if w is no valid width of the gaussian window filter"""
+    if w < 1 or w % 2 == 0:
+        raise ValueError(f"window width must be odd and positive, got {w}")
+
+
+def warmup(w=WINDOW):
+    """load (or compile) numba kernels and import OpenCV on a tiny dummy frame"""
+    img = np.zeros((2 * w + 1, 2 * w + 1), dtype=np.uint8)
+    sd.detect_stars(sd.gaussian_window_filter(img, w))
+
+
+def nearest_code(hashtable, code, rows=None):
+    """
+    find hashtable row with closest hashcode
+
+    Parameters
+    ----------
+    hashtable : HashTable object
+    code : (4,) np.ndarray with hash code
+    rows : (optional) np.ndarray with row indices to restrict the search to
+
+    Returns
+    -------
+    i_row : int, row index in hashtable
+    dist : float, euclidean distance between codes
+    """
+    codes = hashtable.codes if rows is None else hashtable.codes[rows]
+    if len(codes) == 0:
+        raise ValueError("no hashtable rows to search in")
+    dist = np.linalg.norm(codes - code, axis=1)
+    i_min = np.argmin(dist)
+    i_row = i_min if rows is None else rows[i_min]
+    return int(i_row), float(dist[i_min])
+
+
+def solve(img, hashtable, w=WINDOW, rows=None):
+    """
+    locate image in reference hashtable
+
+    Parameters
+    ----------
+    img : (H, W) uint8 np.ndarray, grayscale image
+    hashtable : HashTable object
+    w : width of gaussian window filter
+    rows : (optional) np.ndarray with hashtable rows to restrict the search to
+
+    Returns
+    -------
+    result : dict with number of detected stars, matched hashtable row, code
+             distance and the geometry (origin, alpha, scale) of the match
+    """
+    img_filtered = sd.gaussian_window_filter(img, w)
+    star_pos, star_brightness = sd.detect_stars(img_filtered)
+    if len(star_pos) < 4:
+        raise ValueError(f"at least 4 stars required, detected {len(star_pos)}")
+
+    # quad of the 4 brightest stars, brightest first
+    brightest = star_pos[np.argsort(star_brightness)[:-5:-1]]
+    code, origin, alpha, scale = hsh.generate_quad_code(brightest, return_geometry=True)
+    i_row, dist = nearest_code(hashtable, code, rows)
+
+    return {
+        "n_stars": len(star_pos),
+        "row": i_row,
+        "distance": dist,
+        "ra": float(hashtable.origin[i_row, 0]),
+        "dec": float(hashtable.origin[i_row, 1]),
+        "alpha": float(hashtable.alpha[i_row]),
+        "scale": float(hashtable.scale[i_row]),
+        "img_origin": [float(origin[0]), float(origin[1])],
+        "img_alpha": float(alpha),
+        "img_scale": float(scale),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("image", help="path to image file")
+    parser.add_argument("--table", default="data/pleiades.hashtable")
+    parser.add_argument("--window", type=int, default=WINDOW)
+    args = parser.parse_args(argv)
+    try:
+        check_window(args.window)
+    except ValueError as err:
+        parser.error(str(err))
+
+    t_start = time.perf_counter()
+    hashtable = HashTable().load(args.table)
+    t_table = time.perf_counter()
+    warmup(args.window)
+    t_warmup = time.perf_counter()
+    result = solve(load_image(args.image), hashtable, args.window)
+    t_solve = time.perf_counter()
+
+    print(
+        f"[solver] table {t_table - t_start:.3f}s, warmup {t_warmup - t_table:.3f}s,"
+        f" solve {t_solve - t_warmup:.3f}s"
+    )
+    print(result)
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,13 @@
 import numba as nb
 import numpy as np
-import cv2
+
+MIN_COARSE_WINDOW = 5  # pixels, see detect_stars_pyramid()
 
 _argmax = lambda I: np.array(np.unravel_index(np.argmax(I), I.shape))[::-1]
 _argsort2d = lambda I: np.array(np.unravel_index(np.argsort(I, axis=None), I.shape)).T
 
 
-@nb.njit
+@nb.njit(cache=True)
 def gaussian_window_filter(img, w=5):
     """find stars using probability theory"""
     assert w % 2 == 1
@@ -26,6 +27,8 @@ def gaussian_window_filter(img, w=5):
 
 def detect_stars(img, radius=15, treshold=70, max_stars=30):
     """star-detection: finding local maxima via treshold, size = cumulated luminocity in blurred neighborhood"""
+    import cv2  # imported lazily, OpenCV dominates the import time of this module
+
     I = np.copy(img)
     blurred = cv2.GaussianBlur(I, (31, 31), 0)
     ordered_minima = _argsort2d(I)[::-1]  # from highest value to lowest
@@ -61,3 +64,104 @@ def detect_stars(img, radius=15, treshold=70, max_stars=30):
         local_minima[i_star, :] = idx
         i_star += 1
     return local_minima[:n_stars], minima_brightness[:n_stars]
+
+
+def _downsample_max(img, f):
+    """max-pool image by factor f, which keeps the peak values of point-like stars"""
+    h, w = (img.shape[0] // f) * f, (img.shape[1] // f) * f
+    return img[:h, :w].reshape(h // f, f, w // f, f).max(axis=(1, 3))
+
+
+def detect_stars_pyramid(
+    img, w=25, levels=2, roi=32, radius=15, treshold=70, max_stars=30
+):
+    """
+    coarse-to-fine star detection for large frames, replacing
+    `detect_stars(gaussian_window_filter(img, w), radius, treshold, max_stars)`
+
+    Candidates are detected on the image max-pooled by 2**levels. Position and
+    brightness of each candidate are then refined in full resolution, where the
+    filter and blur are only evaluated on a (roi x roi) region of interest plus
+    the margin the brightness sum needs.
+
+    Parameters
+    ----------
+    img : (H, W) uint8 np.ndarray, unfiltered grayscale image
+    w : width of gaussian window filter in full resolution
+    levels : number of pyramid levels, each halving the resolution. The coarse
+             window w // 2**levels must keep at least MIN_COARSE_WINDOW pixels,
+             e.g. levels <= 2 for w = 25, as smaller windows are dominated by
+             the pooled stars themselves and miss them
+    roi : edge length of full resolution region of interest in pixels
+
+    Returns
+    -------
+    like detect_stars(), coordinates refer to the filtered (H-w, W-w) image
+    """
+    import cv2
+
+    f = 2**levels
+    hw = w // 2
+    w_coarse = (w // f) | 1
+    if w_coarse < MIN_COARSE_WINDOW:
+        raise ValueError(
+            f"coarse window {w_coarse} of w={w} at levels={levels} is smaller"
+            f" than {MIN_COARSE_WINDOW} pixels, reduce levels"
+        )
+
+    # candidates in coarse image, more than needed as some are merged later
+    coarse = _downsample_max(img, f)
+    candidates, _ = detect_stars(
+        gaussian_window_filter(coarse, w_coarse),
+        radius=max(radius // f, 1),
+        treshold=treshold,
+        max_stars=2 * max_stars,
+    )
+    # center of coarse pixel in full resolution filtered frame
+    centers = (candidates.astype(int) + w_coarse // 2) * f + f // 2 - hw
+
+    shape = (img.shape[0] - w, img.shape[1] - w)  # filtered frame
+    pad = radius + 15  # margin for brightness sum over 31x31 gaussian blur
+    peaks = []  # (peak value, iy, ix, brightness)
+    for cy, cx in centers:
+        y0, y1 = max(cy - roi // 2, 0), min(cy + roi // 2, shape[0])
+        x0, x1 = max(cx - roi // 2, 0), min(cx + roi // 2, shape[1])
+        if y0 >= y1 or x0 >= x1:
+            continue
+        py0, py1 = max(y0 - pad, 0), min(y1 + pad, shape[0])
+        px0, px1 = max(x0 - pad, 0), min(x1 + pad, shape[1])
+
+        filtered = gaussian_window_filter(img[py0 : py1 + w, px0 : px1 + w], w)
+        inner = filtered[y0 - py0 : y1 - py0, x0 - px0 : x1 - px0]
+        iy, ix = np.unravel_index(np.argmax(inner), inner.shape)
+        if inner[iy, ix] < treshold:
+            continue
+        iy, ix = iy + y0, ix + x0
+
+        blurred = cv2.GaussianBlur(filtered, (31, 31), 0)
+        brightness = np.sum(
+            blurred[
+                max(iy - radius, 0) - py0 : min(iy + radius, shape[0]) - py0,
+                max(ix - radius, 0) - px0 : min(ix + radius, shape[1]) - px0,
+            ]
+        )
+        peaks.append((int(inner.max()), iy, ix, brightness))
+
+    # suppress duplicates like detect_stars, from highest value to lowest
+    peaks.sort(key=lambda p: p[0], reverse=True)
+    local_minima = np.zeros((max_stars, 2))
+    minima_brightness = np.zeros(max_stars)
+    n_stars = 0
+    for _, iy, ix, brightness in peaks:
+        if n_stars >= max_stars:
+            break
+        if np.any(
+            (np.abs(local_minima[:n_stars, 0] - iy) <= radius)
+            & (np.abs(local_minima[:n_stars, 1] - ix) <= radius)
+        ):
+            continue
+        local_minima[n_stars] = iy, ix
+        minima_brightness[n_stars] = brightness
+        n_stars += 1
+    print(f"[star detection] detected {n_stars} stars in pyramid mode")
+    return local_minima[:n_stars], minima_brightness[:n_stars]
@@ -7,3 +7,54 @@ def hour_angle_to_rad(h, m=None, s=None):
         return np.pi * h / 12
     else:
         return np.pi * (h / 12 + m / 720 + s / 43200)
+
+
+SIDEREAL_RATE = 2 * np.pi / 86164.0905  # rad/s, rotation rate of earth w.r.t. stars
+
+
+def local_sidereal_time(t, longitude):
+    """
+    local sidereal time in RAD
+
+    Parameters
+    ----------
+    t : float, unix time in s (UTC)
+    longitude : float, geographic longitude in RAD, positive eastwards
+    """
+    # https://en.wikipedia.org/wiki/Sidereal_time (earth rotation angle)
+    days_j2000 = t / 86400 + 2440587.5 - 2451545.0
+    era = 2 * np.pi * (0.7790572732640 + 1.00273781191135448 * days_j2000)
+    return np.mod(era + longitude, 2 * np.pi)
+
+
+def equatorial_to_horizontal(ha, dec, latitude):
+    """hour angle and declination to altitude and azimuth (from north over east), all in RAD"""
+    # https://en.wikipedia.org/wiki/Astronomical_coordinate_systems
+    alt = np.arcsin(
+        np.sin(dec) * np.sin(latitude) + np.cos(dec) * np.cos(latitude) * np.cos(ha)
+    )
+    az = np.arctan2(
+        -np.cos(dec) * np.sin(ha),
+        np.sin(dec) * np.cos(latitude) - np.cos(dec) * np.sin(latitude) * np.cos(ha),
+    )
+    return alt, np.mod(az, 2 * np.pi)
+
+
+def horizontal_to_equatorial(alt, az, latitude):
+    """altitude and azimuth (from north over east) to hour angle and declination, all in RAD"""
+    # the transformation is symmetric in (ha, dec) and (az, alt)
+    dec, ha = equatorial_to_horizontal(az, alt, latitude)
+    return ha, dec
+
+
+def latency_stats(latency):
+    """mean, median, 95th percentile and maximal value of latencies in s"""
+    if len(latency) == 0:
+        return {}
+    lat = np.array(latency)
+    return {
+        "mean": float(np.mean(lat)),
+        "p50": float(np.percentile(lat, 50)),
+        "p95": float(np.percentile(lat, 95)),
+        "max": float(np.max(lat)),
+    }
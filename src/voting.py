@@ -0,0 +1,223 @@
+"""
+pointing hypotheses from votes of all image quad matches
+
+Every image quad is matched to all close hashtable codes. Each match predicts
+where the image center lies on the sky and how the image is rotated, which is
+cast as a vote into a sparse (ra, dec, rotation) histogram. Bins with the most
+votes are consistent with many independent quads and are returned as ranked
+hypotheses for verification, after suppressing neighbouring bins of the same
+pose.
+
+Star coordinates must have the same handedness as (ra, dec), hash codes of
+mirrored images do not match.
+"""
+
+import numpy as np
+
+from src import hashing as hsh
+
+
+def match_codes(img_codes, hashtable, k=5, max_dist=0.02, rows=None, chunk=256):
+    """
+    find the k closest hashtable codes for every image code
+
+    Parameters
+    ----------
+    img_codes : (n,4) np.ndarray with hash codes of image quads
+    hashtable : HashTable object
+    k : maximal number of matches per image code
+    max_dist : maximal euclidean distance between matched codes
+    rows : (optional) np.ndarray with hashtable rows to restrict the search to
+    chunk : number of image codes compared at once, limits memory
+
+    Returns
+    -------
+    i_img : (m,) np.ndarray with indices of image codes
+    i_row : (m,) np.ndarray with matched hashtable rows
+    dist : (m,) np.ndarray with code distances
+    """
+    table_codes = hashtable.codes if rows is None else hashtable.codes[rows]
+    table_codes = np.asarray(table_codes, dtype=float)
+    k = min(k, len(table_codes))
+    if k == 0 or len(img_codes) == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0)
+
+    table_sq = np.sum(table_codes**2, axis=1)
+    i_img, i_row, dist = [], [], []
+    for start in range(0, len(img_codes), chunk):
+        codes = img_codes[start : start + chunk]
+        # squared distances of all pairs, |a-b|^2 = |a|^2 + |b|^2 - 2ab
+        d_sq = np.sum(codes**2, axis=1)[:, None] + table_sq - 2 * codes @ table_codes.T
+        nearest = np.argpartition(d_sq, k - 1, axis=1)[:, :k]
+        d_nearest = np.sqrt(np.maximum(np.take_along_axis(d_sq, nearest, 1), 0))
+        i_code, i_k = np.nonzero(d_nearest <= max_dist)
+        i_img.append(start + i_code)
+        i_row.append(nearest[i_code, i_k])
+        dist.append(d_nearest[i_code, i_k])
+
+    i_row = np.concatenate(i_row)
+    if rows is not None:
+        i_row = rows[i_row]
+    return np.concatenate(i_img), i_row, np.concatenate(dist)
+
+
+def pointing_votes(
+    img_origin, img_alpha, img_scale, ref_origin, ref_alpha, ref_scale, img_center
+):
+    """
+    coarse pointing of the image center for each matched pair of quads
+
+    A quad's coordinate system is spanned by its most distant stars A and B,
+    with A at `origin`, B in direction (sin(alpha), cos(alpha)) and
+    |AB| = 1/sqrt(scale). As codes are symmetric in A and B, both pairings
+    A->A and A->B are voted for, only the correct one accumulates.
+
+    Parameters
+    ----------
+    img_* : geometry of image quads in pixels, as from generate_quad_code()
+    ref_* : geometry of matched hashtable rows in RAD
+    img_center : (2,) image center in the coordinates of the image quads
+
+    Returns
+    -------
+    ra, dec : (2m,) np.ndarray, image center in RAD
+    rotation : (2m,) np.ndarray, rotation from image to sky in [0, 2*pi)
+    pixel_scale : (2m,) np.ndarray, RAD per pixel
+    """
+    img_len = 1 / np.sqrt(img_scale)
+    ref_len = 1 / np.sqrt(ref_scale)
+    img_b = img_origin + img_len[:, None] * np.column_stack(
+        (np.sin(img_alpha), np.cos(img_alpha))
+    )
+    # second pairing: start image system in B, pointing back to A
+    img_origin = np.concatenate((img_origin, img_b))
+    img_alpha = np.concatenate((img_alpha, img_alpha + np.pi))
+    img_len = np.tile(img_len, 2)
+    ref_origin = np.tile(ref_origin, (2, 1))
+    ref_alpha = np.tile(ref_alpha, 2)
+    ref_len = np.tile(ref_len, 2)
+
+    pixel_scale = ref_len / img_len
+    rotation = np.mod(img_alpha - ref_alpha, 2 * np.pi)
+    offset = img_center - img_origin
+    cos, sin = np.cos(rotation), np.sin(rotation)
+    ra = ref_origin[:, 0] + pixel_scale * (cos * offset[:, 0] - sin * offset[:, 1])
+    dec = ref_origin[:, 1] + pixel_scale * (sin * offset[:, 0] + cos * offset[:, 1])
+    return np.mod(ra, 2 * np.pi), dec, rotation, pixel_scale
+
+
+def top_hypotheses(ra, dec, rotation, pixel_scale, pos_bin, rot_bin, top_k=5):
+    """
+    accumulate votes in a sparse (ra, dec, rotation) histogram
+
+    A pose close to a bin edge splits its votes over neighbouring bins. Bins are
+    therefore accepted by decreasing votes, and each accepted bin absorbs the
+    votes of its not yet accepted neighbours (non-maximum suppression).
+
+    Parameters
+    ----------
+    ra, dec, rotation, pixel_scale : votes as from pointing_votes()
+    pos_bin : bin width of ra and dec in RAD
+    rot_bin : bin width of rotation in RAD
+    top_k : number of hypotheses
+
+    Returns
+    -------
+    hypotheses : list of dicts with mean ra, dec, rotation, pixel_scale of a
+                 bin and the number of votes of it and its neighbours, ranked
+                 by votes
+    """
+    if len(ra) == 0:
+        return []
+    n_ra = int(np.ceil(2 * np.pi / pos_bin))
+    n_dec = int(np.ceil(np.pi / pos_bin)) + 1
+    n_rot = int(np.ceil(2 * np.pi / rot_bin))
+    i_ra = np.floor(ra / pos_bin).astype(np.int64) % n_ra
+    i_dec = np.clip(np.floor((dec + np.pi / 2) / pos_bin), 0, n_dec - 1)
+    i_rot = np.floor(rotation / rot_bin).astype(np.int64) % n_rot
+
+    bins, inverse, votes = np.unique(
+        np.column_stack((i_ra, i_dec.astype(np.int64), i_rot)),
+        axis=0,
+        return_inverse=True,
+        return_counts=True,
+    )
+    inverse = inverse.ravel()
+    mean = lambda x: np.bincount(inverse, weights=x) / votes
+    means = list(zip(*map(mean, (ra, dec, rotation, pixel_scale))))
+    # bin distance, ra and rotation are periodic
+    dist = lambda d, n: np.minimum(np.abs(d) % n, n - np.abs(d) % n)
+
+    free = np.ones(len(votes), dtype=bool)
+    hypotheses = []
+    for i in np.argsort(-votes, kind="stable"):
+        if len(hypotheses) == top_k:
+            break
+        if not free[i]:
+            continue
+        d = bins - bins[i]
+        near = (
+            free
+            & (dist(d[:, 0], n_ra) <= 1)
+            & (np.abs(d[:, 1]) <= 1)
+            & (dist(d[:, 2], n_rot) <= 1)
+        )
+        free &= ~near
+        r, de, rot, sc = means[i]
+        hypotheses.append(
+            {
+                "ra": float(r),
+                "dec": float(de),
+                "rotation": float(rot),
+                "pixel_scale": float(sc),
+                "votes": int(np.sum(votes[near])),
+            }
+        )
+    return sorted(hypotheses, key=lambda h: h["votes"], reverse=True)
+
+
+def pointing_hypotheses(
+    star_pos,
+    star_brightness,
+    hashtable,
+    img_center,
+    top_k=5,
+    k=5,
+    max_dist=0.02,
+    pos_bin=1e-3,
+    rot_bin=np.deg2rad(5),
+    max_stars=10,
+    rows=None,
+):
+    """
+    ranked pointing hypotheses for detected stars
+
+    Parameters
+    ----------
+    star_pos : (n,2) np.ndarray with star coordinates in pixels
+    star_brightness : (n,) np.ndarray with star brightness
+    hashtable : HashTable object
+    img_center : (2,) image center in the coordinates of star_pos
+    top_k : number of hypotheses
+    k, max_dist, rows : see match_codes()
+    pos_bin, rot_bin : see top_hypotheses()
+    max_stars : number of brightest stars to build quads from
+
+    Returns
+    -------
+    hypotheses : see top_hypotheses()
+    """
+    codes, origin, alpha, scale = hsh.generate_all_hash_codes(
+        star_pos, star_brightness, max_stars
+    )
+    i_img, i_row, _ = match_codes(codes, hashtable, k, max_dist, rows)
+    votes = pointing_votes(
+        origin[i_img],
+        alpha[i_img],
+        scale[i_img],
+        hashtable.origin[i_row],
+        hashtable.alpha[i_row],
+        hashtable.scale[i_row],
+        np.asarray(img_center),
+    )
+    return top_hypotheses(*votes, pos_bin, rot_bin, top_k)